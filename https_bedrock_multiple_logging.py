@@ -15,6 +15,8 @@ import argparse
 import os
 import logging
 
+from near_duplicate_cache import NearDuplicateCache, cached_call
+
 # ---------- Enums ----------
 class Actions(Enum):
     DETECT_ADDRESS = "detect_address"
@@ -24,6 +26,7 @@ class Actions(Enum):
 class RequestModel(BaseModel):
     entity_urn: str = Field(..., description="Unique identifier for the entity")
     content: str = Field(..., description="Content to be processed")
+    use_cache: bool = Field(default=True, description="Reuse the result of a recent near-duplicate request")
 
 class ResponseModel(BaseModel):
     message: str = Field(description="Result of the operation, e.g., 'success' or 'failure'")
@@ -47,8 +50,8 @@ app.add_middleware(
 def get_bedrock_client():
     return boto3.client("bedrock-runtime", region_name="us-east-1")
 
-def get_bedrock_response(model_id: str, prompt_text: str, max_tokens: int = 1000, temperature: float = 0.3) -> str:
-    """Send prompt to AWS Bedrock model and return text output"""
+def get_bedrock_response(model_id: str, prompt_text: str, max_tokens: int = 1000, temperature: float = 0.3) -> tuple:
+    """Send prompt to AWS Bedrock model and return (text output, whether the text was parsed from the model output)"""
     logger.info(f"Sending prompt to Bedrock model {model_id}")
     logger.debug(f"Prompt text: {prompt_text}")
 
@@ -84,19 +87,20 @@ def get_bedrock_response(model_id: str, prompt_text: str, max_tokens: int = 1000
                 text_chunks = [c.get("text", "") for c in contents if "text" in c]
                 output_text = "\n".join(text_chunks).strip()
 
-        if not output_text:
+        parsed = bool(output_text)
+        if not parsed:
             logger.warning(f"No recognizable text output in Bedrock response: {resp_body}")
             output_text = str(resp_body)
 
         logger.info(f"Parsed Bedrock output: {output_text[:500]}")
-        return output_text
+        return output_text, parsed
 
     except Exception as e:
         logger.error(f"Bedrock API error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to connect to AWS Bedrock: {str(e)}")
 
 # ---------- Core Functions ----------
-def detect_addresses(model_id: str, content: str) -> str:
+def detect_addresses(model_id: str, content: str) -> tuple:
     prompt = f"""
 Extract all addresses from the following text. Return only the addresses, separated by ' || '.
 If no addresses are found, return empty string.
@@ -120,7 +124,7 @@ SENTIMENT_SCORE: [score between -1.0 and 1.0]
 
 Text: {content}
 """
-    response = get_bedrock_response(model_id, prompt)
+    response, _ = get_bedrock_response(model_id, prompt)
 
     logger.info(f"Full model text response for summarization:\n{response}")
 
@@ -158,6 +162,7 @@ async def root():
             "address_detection": "/address-detection",
             "summarization": "/summarize",
             "health": "/health",
+            "cache_stats": "/cache/stats",
             "docs": "/docs",
         },
     }
@@ -166,6 +171,12 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "Address Detection and Summarization API (Bedrock)", "version": "1.1.0"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    if DEDUP_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **DEDUP_CACHE.stats()}
+
 @app.post("/address-detection", response_model=ResponseModel)
 async def address_detection(request: RequestModel):
     logger.info(f"Received /address-detection request: entity_urn={request.entity_urn}")
@@ -182,7 +193,12 @@ async def address_detection(request: RequestModel):
                 sentiment=None,
             )
 
-        addresses = detect_addresses(DEFAULT_MODEL_ARN, request.content)
+        # Only results parsed from real model output are cached
+        addresses, _ = cached_call(
+            DEDUP_CACHE, DEFAULT_MODEL_ARN, Actions.DETECT_ADDRESS.value, request.content,
+            lambda: detect_addresses(DEFAULT_MODEL_ARN, request.content), logger,
+            use_cache=request.use_cache, is_cacheable=lambda r: r[1], entity_urn=request.entity_urn,
+        )
         logger.info(f"/address-detection result for entity_urn={request.entity_urn}: {addresses}")
 
         return ResponseModel(
@@ -219,7 +235,11 @@ async def summarize(request: RequestModel):
                 sentiment={},
             )
 
-        summary, sentiment = summarize_and_analyze_sentiment(DEFAULT_MODEL_ARN, request.content)
+        summary, sentiment = cached_call(
+            DEDUP_CACHE, DEFAULT_MODEL_ARN, Actions.SUMMARIZE.value, request.content,
+            lambda: summarize_and_analyze_sentiment(DEFAULT_MODEL_ARN, request.content), logger,
+            use_cache=request.use_cache, is_cacheable=lambda r: bool(r[0]), entity_urn=request.entity_urn,
+        )
         logger.info(f"/summarize result for entity_urn={request.entity_urn}: summary={summary}, sentiment={sentiment}")
 
         return ResponseModel(
@@ -249,10 +269,28 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, required=True, help="Port to run FastAPI server on")
     parser.add_argument("--certfile", type=str, help="Path to SSL certificate file (.crt or .pem)")
     parser.add_argument("--keyfile", type=str, help="Path to SSL private key file (.key)")
+    parser.add_argument("--no-dedup-cache", action="store_true", help="Disable the near-duplicate result cache")
+    parser.add_argument("--dedup-threshold", type=float, default=0.85, help="Jaccard similarity needed to reuse a cached result")
+    parser.add_argument("--dedup-address-threshold", type=float, default=1.0, help="Similarity needed to reuse an address detection result (1.0 = exact content match)")
+    parser.add_argument("--dedup-capacity", type=int, default=2048, help="Maximum number of cached requests")
+    parser.add_argument("--dedup-ttl", type=float, default=3600.0, help="Seconds a cached result stays reusable (0 = no expiry)")
     args = parser.parse_args()
 
     DEFAULT_MODEL_ARN = args.model_id
 
+    # ---------- Near-duplicate result cache ----------
+    DEDUP_CACHE = None
+    if not args.no_dedup_cache:
+        try:
+            DEDUP_CACHE = NearDuplicateCache(
+                capacity=args.dedup_capacity,
+                threshold=args.dedup_threshold,
+                ttl_seconds=args.dedup_ttl,
+                action_thresholds={Actions.DETECT_ADDRESS.value: args.dedup_address_threshold},
+            )
+        except ValueError as e:
+            parser.error(f"invalid near-duplicate cache option: {e}")
+
     # ---------- Dynamic log file based on port ----------
     LOG_FILE_PATH = f"/home/ssm-user/bedrock/bedrock{args.port}_api.log"
 
@@ -272,6 +310,10 @@ if __name__ == "__main__":
     logger.addHandler(console_handler)
 
     logger.info(f"Starting Bedrock FastAPI server on port {args.port} with model {DEFAULT_MODEL_ARN}")
+    if DEDUP_CACHE is not None:
+        logger.info(f"Near-duplicate cache enabled (threshold={args.dedup_threshold}, address_threshold={args.dedup_address_threshold}, capacity={args.dedup_capacity}, ttl={args.dedup_ttl}s)")
+    else:
+        logger.info("Near-duplicate cache disabled")
 
     ssl_options = {}
     if args.certfile and args.keyfile:
@@ -15,6 +15,8 @@ import argparse
 import os
 import logging
 
+from near_duplicate_cache import NearDuplicateCache, cached_call
+
 # ---------- Enums ----------
 class Actions(Enum):
     DETECT_ADDRESS = "detect_address"
@@ -24,6 +26,7 @@ class Actions(Enum):
 class RequestModel(BaseModel):
     entity_urn: str = Field(..., description="Unique identifier for the entity")
     content: str = Field(..., description="Content to be processed")
+    use_cache: bool = Field(default=True, description="Reuse the result of a recent near-duplicate request")
 
 class ResponseModel(BaseModel):
     message: str = Field(description="Result of the operation, e.g., 'success' or 'failure'")
@@ -60,8 +63,8 @@ def is_llama_model(model_id: str) -> bool:
 
 def get_bedrock_response(model_id: str, prompt_text: str,
                          max_tokens: int = 1000,
-                         temperature: float = 0.3) -> str:
-    """Send prompt to AWS Bedrock model and return parsed text output."""
+                         temperature: float = 0.3) -> tuple:
+    """Send prompt to AWS Bedrock model and return (parsed text output, whether the output field was present)."""
 
     logger.info(f"Sending prompt to Bedrock model {model_id}")
     client = get_bedrock_client()
@@ -112,16 +115,16 @@ def get_bedrock_response(model_id: str, prompt_text: str,
     # ---------- PARSE OUTPUT ----------
     # AIP + LLAMA share the same output format
     if is_aip(model_id) or is_llama_model(model_id):
-        return raw.get("generation", "").strip()
+        return raw.get("generation", "").strip(), "generation" in raw
 
     # Anthropic
     content = raw.get("content", [])
     txt = [c.get("text", "") for c in content if "text" in c]
-    return "\n".join(txt).strip()
+    return "\n".join(txt).strip(), bool(txt)
 
 
 # ---------- Core Functions ----------
-def detect_addresses(model_id: str, content: str) -> str:
+def detect_addresses(model_id: str, content: str) -> tuple:
     prompt = f"""
 Extract all addresses from the following text. Return only the addresses, separated by ' || '.
 If no addresses are found, return empty string.
@@ -146,7 +149,7 @@ SENTIMENT_SCORE: ...
 Text: {content}
 """
 
-    response = get_bedrock_response(model_id, prompt)
+    response, _ = get_bedrock_response(model_id, prompt)
     logger.info(f"Full model text response:\n{response}")
 
     summary = ""
@@ -177,12 +180,25 @@ async def root():
         "message": "Address Detection & Summarization API",
         "version": "1.1.0",
         "status": "healthy",
+        "endpoints": {
+            "address_detection": "/address-detection",
+            "summarization": "/summarize",
+            "health": "/health",
+            "cache_stats": "/cache/stats",
+            "docs": "/docs",
+        },
     }
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "version": "1.1.0"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    if DEDUP_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **DEDUP_CACHE.stats()}
+
 @app.post("/address-detection", response_model=ResponseModel)
 async def address_detection(request: RequestModel):
     logger.info(f"Received /address-detection request: {request.entity_urn}")
@@ -197,7 +213,12 @@ async def address_detection(request: RequestModel):
         )
 
     try:
-        addresses = detect_addresses(DEFAULT_MODEL_ARN, request.content)
+        # Only results parsed from real model output are cached
+        addresses, _ = cached_call(
+            DEDUP_CACHE, DEFAULT_MODEL_ARN, Actions.DETECT_ADDRESS.value, request.content,
+            lambda: detect_addresses(DEFAULT_MODEL_ARN, request.content), logger,
+            use_cache=request.use_cache, is_cacheable=lambda r: r[1], entity_urn=request.entity_urn,
+        )
         return ResponseModel(
             message="success",
             result=addresses,
@@ -229,7 +250,11 @@ async def summarize(request: RequestModel):
         )
 
     try:
-        summary, sentiment = summarize_and_analyze_sentiment(DEFAULT_MODEL_ARN, request.content)
+        summary, sentiment = cached_call(
+            DEDUP_CACHE, DEFAULT_MODEL_ARN, Actions.SUMMARIZE.value, request.content,
+            lambda: summarize_and_analyze_sentiment(DEFAULT_MODEL_ARN, request.content), logger,
+            use_cache=request.use_cache, is_cacheable=lambda r: bool(r[0]), entity_urn=request.entity_urn,
+        )
         return ResponseModel(
             message="success",
             result=summary,
@@ -257,10 +282,28 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, required=True, help="Port to run FastAPI server on")
     parser.add_argument("--certfile", type=str, help="Path to SSL certificate (.crt or .pem)")
     parser.add_argument("--keyfile", type=str, help="Path to SSL private key (.key)")
+    parser.add_argument("--no-dedup-cache", action="store_true", help="Disable the near-duplicate result cache")
+    parser.add_argument("--dedup-threshold", type=float, default=0.85, help="Jaccard similarity needed to reuse a cached result")
+    parser.add_argument("--dedup-address-threshold", type=float, default=1.0, help="Similarity needed to reuse an address detection result (1.0 = exact content match)")
+    parser.add_argument("--dedup-capacity", type=int, default=2048, help="Maximum number of cached requests")
+    parser.add_argument("--dedup-ttl", type=float, default=3600.0, help="Seconds a cached result stays reusable (0 = no expiry)")
     args = parser.parse_args()
 
     DEFAULT_MODEL_ARN = args.model_id
 
+    # ---------- Near-duplicate result cache ----------
+    DEDUP_CACHE = None
+    if not args.no_dedup_cache:
+        try:
+            DEDUP_CACHE = NearDuplicateCache(
+                capacity=args.dedup_capacity,
+                threshold=args.dedup_threshold,
+                ttl_seconds=args.dedup_ttl,
+                action_thresholds={Actions.DETECT_ADDRESS.value: args.dedup_address_threshold},
+            )
+        except ValueError as e:
+            parser.error(f"invalid near-duplicate cache option: {e}")
+
     # Logging
     LOG_FILE_PATH = f"/home/ssm-user/bedrock/bedrock{args.port}_api.log"
     logger = logging.getLogger(__name__)
@@ -275,6 +318,11 @@ if __name__ == "__main__":
     ch.setFormatter(fmt)
     logger.addHandler(ch)
 
+    if DEDUP_CACHE is not None:
+        logger.info(f"Near-duplicate cache enabled (threshold={args.dedup_threshold}, address_threshold={args.dedup_address_threshold}, capacity={args.dedup_capacity}, ttl={args.dedup_ttl}s)")
+    else:
+        logger.info("Near-duplicate cache disabled")
+
     ssl_options = {}
     if args.certfile and args.keyfile:
         ssl_options = {"ssl_certfile": args.certfile, "ssl_keyfile": args.keyfile}
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate result cache for the Bedrock summarization / address detection APIs.
+Content is shingled, MinHash-signed and bucketed with LSH so lightly edited documents
+(new signature, timestamps, forwarded headers) reuse the result of a recent request
+for the same model and action instead of triggering another Bedrock call.
+A threshold of 1.0 only reuses results for content that is identical once whitespace
+is collapsed, which is what address detection needs: near-duplicate emails usually
+differ in exactly the address-bearing lines.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# Mersenne prime 2^31 - 1: keeps (a * x + b) inside uint64 for 31-bit a and x
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_WHITESPACE = re.compile(r"\s+")
+# Shingle hashes permuted per step; bounds signature() memory at num_perm x 4096 uint64
+_SIGNATURE_CHUNK = 4096
+
+
+def shingle_hashes(content: str, shingle_size: int = 5) -> np.ndarray:
+    """Return the unique 31-bit hashes of the word shingles of `content`."""
+    words = _WHITESPACE.sub(" ", content.lower()).strip().split(" ")
+    if len(words) <= shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    return np.unique(hashes % _MERSENNE_PRIME)
+
+
+def content_digest(content: str) -> bytes:
+    """Digest of `content` with whitespace collapsed, used for exact-match lookups."""
+    normalized = _WHITESPACE.sub(" ", content).strip()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+class NearDuplicateCache:
+    """
+    Fixed-capacity MinHash/LSH cache keyed by (model_id, action).
+    `action_thresholds` overrides `threshold` per action; a threshold of 1.0 requires
+    an exact (whitespace-normalized) content match rather than a MinHash estimate of 1.0.
+    """
+
+    def __init__(self, capacity: int = 2048, threshold: float = 0.85,
+                 num_perm: int = 128, bands: int = 32, shingle_size: int = 5,
+                 ttl_seconds: float = 3600.0, seed: int = 1,
+                 action_thresholds: Optional[Dict[str, float]] = None):
+        action_thresholds = dict(action_thresholds or {})
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        for value in [threshold, *action_thresholds.values()]:
+            if not 0.0 < value <= 1.0:
+                raise ValueError("threshold must be in (0, 1]")
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if ttl_seconds < 0:
+            raise ValueError("ttl_seconds must be non-negative (0 = no expiry)")
+
+        self.capacity = capacity
+        self.threshold = threshold
+        self.action_thresholds = action_thresholds
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.ttl_seconds = ttl_seconds
+
+        rng = np.random.RandomState(seed)
+        prime = int(_MERSENNE_PRIME)
+        self._a = rng.randint(1, prime, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, prime, size=(num_perm, 1)).astype(np.uint64)
+
+        # Array-backed ring buffer: slot i holds one cached request
+        self._signatures = np.zeros((capacity, num_perm), dtype=np.uint32)
+        self._created = np.zeros(capacity, dtype=np.float64)
+        self._namespaces = [None] * capacity
+        self._results = [None] * capacity
+        self._digests = [None] * capacity
+        self._bucket_keys = [()] * capacity
+        self._buckets: Dict[Tuple, set] = {}
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._action_stats: Dict[str, Dict[str, int]] = {}
+
+    # ---------- Signatures ----------
+    def signature(self, content: str) -> np.ndarray:
+        """MinHash signature of `content`, one uint32 per permutation."""
+        hashes = shingle_hashes(content, self.shingle_size)
+        signature = np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+        for start in range(0, hashes.size, _SIGNATURE_CHUNK):
+            chunk = hashes[np.newaxis, start:start + _SIGNATURE_CHUNK]
+            permuted = self._a * chunk
+            permuted += self._b
+            permuted %= _MERSENNE_PRIME
+            np.minimum(signature, permuted.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+    def _band_keys(self, namespace: Tuple[str, str], signature: np.ndarray) -> Tuple:
+        bands = signature.reshape(self.bands, self.rows)
+        return tuple((namespace, band, bands[band].tobytes()) for band in range(self.bands))
+
+    def threshold_for(self, action: str) -> float:
+        return self.action_thresholds.get(action, self.threshold)
+
+    # ---------- Lookup / Store ----------
+    def lookup(self, model_id: str, action: str,
+               content: str) -> Tuple[Optional[Any], float, np.ndarray]:
+        """
+        Return (result, similarity, signature) for the closest cached item whose
+        estimated Jaccard similarity meets the action's threshold, or (None, best, signature).
+        In exact-match mode (threshold 1.0) the similarity is that of the digest-matching
+        slot, or 0.0 when none matches. The signature can be passed back to `store`.
+        """
+        namespace = (model_id, action)
+        signature = self.signature(content)
+        threshold = self.threshold_for(action)
+        digest = content_digest(content) if threshold >= 1.0 else None
+
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(namespace, signature):
+                candidates.update(self._buckets.get(key, ()))
+
+            best_slot, best_score = None, 0.0
+            if candidates:
+                slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+                if self.ttl_seconds:
+                    slots = slots[self._created[slots] >= time.time() - self.ttl_seconds]
+                if slots.size:
+                    scores = (self._signatures[slots] == signature).mean(axis=1)
+                    if digest is not None:
+                        # Exact-match mode: only a slot with the same digest counts, scored on its own
+                        exact = [i for i, slot in enumerate(slots) if self._digests[slot] == digest]
+                        best = exact[0] if exact else None
+                    else:
+                        best = int(scores.argmax())
+                    if best is not None:
+                        best_slot, best_score = int(slots[best]), float(scores[best])
+
+            hit = best_slot is not None and best_score >= threshold
+            self._record(action, hit)
+            if hit:
+                return self._results[best_slot], best_score, signature
+            return None, best_score, signature
+
+    def store(self, model_id: str, action: str, content: str, result: Any,
+              signature: Optional[np.ndarray] = None) -> None:
+        """Cache `result`, evicting the oldest entry once capacity is reached."""
+        namespace = (model_id, action)
+        if signature is None:
+            signature = self.signature(content)
+        keys = self._band_keys(namespace, signature)
+
+        with self._lock:
+            slot = self._next_slot % self.capacity
+            if self._namespaces[slot] is not None:
+                self._evict(slot)
+
+            self._signatures[slot] = signature
+            self._created[slot] = time.time()
+            self._namespaces[slot] = namespace
+            self._results[slot] = result
+            self._digests[slot] = content_digest(content)
+            self._bucket_keys[slot] = keys
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(slot)
+
+            self._next_slot += 1
+            self._stats["stores"] += 1
+
+    def _evict(self, slot: int) -> None:
+        for key in self._bucket_keys[slot]:
+            members = self._buckets.get(key)
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del self._buckets[key]
+        self._namespaces[slot] = None
+        self._results[slot] = None
+        self._digests[slot] = None
+        self._bucket_keys[slot] = ()
+        self._stats["evictions"] += 1
+
+    # ---------- Stats ----------
+    def _record(self, action: str, hit: bool) -> None:
+        outcome = "hits" if hit else "misses"
+        self._stats["lookups"] += 1
+        self._stats[outcome] += 1
+        per_action = self._action_stats.setdefault(action, {"lookups": 0, "hits": 0, "misses": 0})
+        per_action["lookups"] += 1
+        per_action[outcome] += 1
+
+    @staticmethod
+    def _with_rate(counts: Dict[str, int]) -> Dict:
+        lookups = counts["lookups"]
+        return {**counts, "hit_rate": round(counts["hits"] / lookups, 4) if lookups else 0.0}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            occupied = np.fromiter((ns is not None for ns in self._namespaces),
+                                   dtype=bool, count=self.capacity)
+            if self.ttl_seconds:
+                live = occupied & (self._created >= time.time() - self.ttl_seconds)
+            else:
+                live = occupied
+            return {
+                **self._with_rate(self._stats),
+                "entries": int(live.sum()),
+                "expired_entries": int(occupied.sum() - live.sum()),
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "action_thresholds": dict(self.action_thresholds),
+                "actions": {action: self._with_rate(counts)
+                            for action, counts in self._action_stats.items()},
+            }
+
+
+def cached_call(cache: Optional[NearDuplicateCache], model_id: str, action: str, content: str,
+                compute: Callable[[], Any], logger: logging.Logger, use_cache: bool = True,
+                is_cacheable: Callable[[Any], bool] = bool, entity_urn: str = "") -> Any:
+    """
+    Return the cached result of a near-duplicate request, or `compute()` on a miss.
+    Fresh results are stored only when `is_cacheable(result)` holds; `cache=None`
+    or `use_cache=False` bypasses the cache entirely.
+    """
+    if cache is None or not use_cache:
+        return compute()
+
+    result, similarity, signature = cache.lookup(model_id, action, content)
+    if result is not None:
+        logger.info(f"Near-duplicate cache hit for {action} entity_urn={entity_urn} (similarity={similarity:.3f})")
+        return result
+    logger.debug(f"Near-duplicate cache miss for {action} entity_urn={entity_urn} (best similarity={similarity:.3f})")
+
+    result = compute()
+    if is_cacheable(result):
+        cache.store(model_id, action, content, result, signature)
+    return result
+
+
+# ---------- Self-check (python3 near_duplicate_cache.py) ----------
+def _self_check() -> None:
+    import tracemalloc
+
+    body = " ".join(f"line {i} of the forwarded invoice thread about order delays" for i in range(30))
+
+    # Shingling: whitespace and case do not change the shingle set
+    assert np.array_equal(shingle_hashes(body), shingle_hashes("  " + body.upper().replace(" ", "\n ")))
+    assert shingle_hashes("short text").size == 1
+
+    # (a * x + b) stays below 2^62, so the uint64 arithmetic in signature() cannot overflow
+    cache = NearDuplicateCache(capacity=2, ttl_seconds=0, action_thresholds={"detect_address": 1.0})
+    assert int(cache._a.max()) < 1 << 31 and int(cache._b.max()) < 1 << 31
+    assert int(shingle_hashes(body).max()) < 1 << 31
+
+    # Identical text matches at 1.0; a near duplicate (new signature) still matches for summarize
+    _, _, signature = cache.lookup("m", "summarize", body)
+    cache.store("m", "summarize", body, "summary", signature)
+    assert cache.lookup("m", "summarize", body)[:2] == ("summary", 1.0)
+    assert cache.lookup("m", "summarize", body + "\n--\nSent from my phone")[0] == "summary"
+
+    # Namespace mismatch (other model or action) misses
+    assert cache.lookup("other-model", "summarize", body)[0] is None
+    assert cache.lookup("m", "detect_address", body)[0] is None
+
+    # Address detection at 1.0 only reuses identical content
+    cache.store("m", "detect_address", body + " Ship to 123 Main Street", "123 Main Street")
+    assert cache.lookup("m", "detect_address", body + " Ship to 987 Oak Avenue")[:2] == (None, 0.0)
+    assert cache.lookup("m", "detect_address", body.upper() + " SHIP TO 123 MAIN STREET")[:2] == (None, 0.0)
+    assert cache.lookup("m", "detect_address", body + "  Ship to 123 Main Street ")[0] == "123 Main Street"
+
+    # Ring eviction: the third store overwrites the oldest slot
+    cache.store("m", "summarize", "an unrelated message about the quarterly budget review", "budget")
+    assert cache.lookup("m", "summarize", body)[0] is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 2
+
+    # TTL: expired entries are neither returned nor counted as live
+    cache = NearDuplicateCache(capacity=4, ttl_seconds=60)
+    cache.store("m", "summarize", body, "summary")
+    cache._created[:] -= 120
+    assert cache.lookup("m", "summarize", body)[0] is None
+    stats = cache.stats()
+    assert stats["entries"] == 0 and stats["expired_entries"] == 1
+
+    # Large input: chunked signature equals the one-shot computation, memory stays bounded
+    large = " ".join(f"w{i % 7919} x{i % 104729}" for i in range(50000))
+    hashes = shingle_hashes(large)
+    assert hashes.size > 2 * _SIGNATURE_CHUNK
+    one_shot = ((cache._a * hashes[np.newaxis, :] + cache._b) % _MERSENNE_PRIME).min(axis=1)
+    tracemalloc.start()
+    signature = cache.signature(large)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert np.array_equal(signature, one_shot.astype(np.uint32))
+    assert peak < 48 * 2 ** 20, f"signature() peak {peak / 2 ** 20:.1f} MiB"
+
+    for bad in ({"capacity": 0}, {"ttl_seconds": -1}, {"threshold": 1.5}, {"action_thresholds": {"x": 0}}):
+        try:
+            NearDuplicateCache(**bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"expected ValueError for {bad}")
+
+    print("near_duplicate_cache self-check passed")
+
+
+if __name__ == "__main__":
+    _self_check()
@@ -52,6 +52,7 @@ pip3 install python-dotenv==1.1.1
 pip3 install httpx==0.28.1
 pip3 install requests
 pip3 install boto3
+pip3 install numpy
 
 openAI key: mi/p6JnS67Pgv5WEbs5E8pOEm389
 
@@ -193,6 +194,10 @@ python3 https_bedrock_multiple.py \
  --keyfile server.key
 
 
+--the servers import near_duplicate_cache.py, copy it next to them before starting the services
+cp near_duplicate_cache.py https_bedrock_multiple_logging.py https_bedrock_multiple_logging_llama_claude.py /home/ssm-user/bedrock/
+python3 /home/ssm-user/bedrock/near_duplicate_cache.py
+
 sudo vi /etc/systemd/system/bedrock7860.service
 sudo vi /etc/systemd/system/bedrock7861.service
 
@@ -28,7 +28,7 @@ Text to summarize:
 {content}
 """
 
-    response = get_bedrock_response(model_id, prompt)
+    response, _ = get_bedrock_response(model_id, prompt)
     logger.info(f"Full model text response:\n{response}")
 
     summary = ""